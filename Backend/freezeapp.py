@@ -1,17 +1,560 @@
 import os
-from flask_frozen import Freezer
-from app import app  # Import your Flask app
+import re
+import io
+import gzip
+import json
+import hashlib
+import argparse
+import posixpath
 
-# Initialize Freezer
-freezer = Freezer(app)
+# Try to import optional dependencies
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
 
-if __name__ == '__main__':
-    # Set the destination directory for frozen files
-    app.config['FREEZER_DESTINATION'] = 'build'
+try:
+    from PIL import Image, ImageSequence
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import rjsmin
+    import rcssmin
+    MINIFIERS_AVAILABLE = True
+except ImportError:
+    MINIFIERS_AVAILABLE = False
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGE_DIR = os.path.join(BASE_DIR, '.freeze-stage')
+# Digest of the inputs the stage was frozen from, written once a freeze completes
+STAGE_MARKER = os.path.join(STAGE_DIR, '.inputs-digest')
+# Build state lives outside the output directory so it is never deployed
+CACHE_DIR = os.path.join(BASE_DIR, '.freeze-cache')
+MANIFEST_FILE = 'asset-manifest.json'
+
+# Files the Flask app is rendered from; freezing is skipped when none changed
+FREEZE_INPUTS = ['app.py', 'templates', 'static', 'utils']
+
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.svg', '.json', '.txt', '.xml'}
+SKIPPED_EXTENSIONS = {'.md', '.py', '.pyc'}
+
+# Animated GIFs above this size are transcoded to animated WebP
+GIF_TRANSCODE_THRESHOLD = 512 * 1024
+
+ATTR_PATTERN = re.compile(r'\b(src|href)(\s*=\s*)(["\'])(.*?)\3', re.IGNORECASE)
+CSS_URL_PATTERN = re.compile(r'url\(\s*(["\']?)([^"\')]+)\1\s*\)', re.IGNORECASE)
+SCRIPT_TAG_PATTERN = re.compile(r'<script\s+src=(["\'])([^"\']+)\1\s*>\s*</script>', re.IGNORECASE)
+STYLESHEET_TAG_PATTERN = re.compile(
+    r'<link\s+rel=(["\'])stylesheet\1\s+href=(["\'])([^"\']+)\2\s*/?>', re.IGNORECASE)
+LOADED_TAG_PATTERN = re.compile(r'<(script|img|link|source|iframe|video|audio)\b[^>]*>', re.IGNORECASE)
+REL_PATTERN = re.compile(r'\brel\s*=\s*(["\'])(.*?)\1', re.IGNORECASE)
+# <link> relations the browser fetches while loading the page; hints like
+# preconnect, prefetch or canonical are not part of a cold load
+LOADED_LINK_RELS = {'stylesheet', 'icon', 'preload', 'modulepreload'}
+GAP_PATTERN = re.compile(r'^(\s|<!--.*?-->)*$', re.DOTALL)
+# Parts of a stylesheet the fallback minifier must copy verbatim, plus comments to drop
+CSS_TOKEN_PATTERN = re.compile(
+    r'(?P<literal>"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|url\(\s*[^"\'\s)][^)]*\))'
+    r'|(?P<comment>/\*.*?\*/)', re.DOTALL | re.IGNORECASE)
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_path(destination):
+    """Location of the build state for one output directory"""
+    key = sha256_bytes(os.path.abspath(destination).encode('utf-8'))[:16]
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def load_cache(destination):
+    try:
+        with open(cache_path(destination)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def fingerprint(rel_path, data):
+    """Insert a short content hash into a file name: css/app.css -> css/app.3f2a9c1d.css"""
+    root, ext = posixpath.splitext(rel_path)
+    return f"{root}.{sha256_bytes(data)[:8]}{ext}"
+
+
+def is_local_url(url):
+    """True for references that point into the site rather than to a CDN or anchor"""
+    return not (url.startswith(('#', '//', 'data:', 'mailto:', 'tel:', 'javascript:'))
+                or re.match(r'^[a-zA-Z][a-zA-Z0-9+.-]*:', url))
+
+
+def split_url(url):
+    """Split 'a/b.css?v=1#x' into ('a/b.css', '?v=1#x')"""
+    match = re.match(r'^([^?#]*)(.*)$', url)
+    return match.group(1), match.group(2)
+
+
+def resolve_url(url, from_rel):
+    """Resolve a reference found in from_rel to a site-relative path"""
+    path, _ = split_url(url)
+    if path.startswith('/'):
+        return posixpath.normpath(path.lstrip('/'))
+    return posixpath.normpath(posixpath.join(posixpath.dirname(from_rel), path))
+
+
+def relative_url(target_rel, from_rel, absolute=False):
+    """Build a reference to target_rel in the same style (absolute or relative) as the original"""
+    if absolute:
+        return '/' + target_rel
+    return posixpath.relpath(target_rel, posixpath.dirname(from_rel) or '.')
+
+
+def minify_css(text):
+    if MINIFIERS_AVAILABLE:
+        return rcssmin.cssmin(text)
+    # Conservative fallback: drop comments and collapse whitespace around block
+    # punctuation, leaving strings and unquoted url() values untouched
+    def squeeze(code):
+        code = re.sub(r'\s+', ' ', code)
+        code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+        return code.replace(';}', '}')
+
+    parts, code, position = [], '', 0
+    for match in CSS_TOKEN_PATTERN.finditer(text):
+        code += text[position:match.start()]
+        if match.group('comment') is not None:
+            # Keep a comment from gluing its neighbours together
+            code += ' '
+        else:
+            parts.append(squeeze(code) + match.group('literal'))
+            code = ''
+        position = match.end()
+    parts.append(squeeze(code + text[position:]))
+    return ''.join(parts).strip()
+
+
+def minify_js(text):
+    if MINIFIERS_AVAILABLE:
+        return rjsmin.jsmin(text)
+    # Without a real tokenizer anything beyond trimming risks breaking template literals
+    return text.strip()
+
+
+def transcode_gif(data):
+    """Transcode an animated GIF to animated WebP, or return None if that does not help"""
+    if not PIL_AVAILABLE:
+        return None
+    try:
+        image = Image.open(io.BytesIO(data))
+        frames = [frame.convert('RGBA') for frame in ImageSequence.Iterator(image)]
+        durations = [frame.info.get('duration', 100) for frame in ImageSequence.Iterator(image)]
+        output = io.BytesIO()
+        frames[0].save(output, 'WEBP', save_all=True, append_images=frames[1:],
+                       duration=durations, loop=image.info.get('loop', 0), quality=80, method=4)
+    except Exception as e:
+        print(f"Could not transcode GIF: {e}")
+        return None
+    webp = output.getvalue()
+    return webp if len(webp) < len(data) else None
+
+
+class AssetPipeline:
+    """Turn a directory of plain static files into a cache-friendly build.
+
+    Non-HTML assets get content-hashed names, contiguous local <script> and
+    stylesheet tags are bundled and minified, large GIFs become WebP and every
+    text output gets precompressed .gz/.br siblings. References found in HTML
+    attributes and CSS url() point at the hashed names; each asset is also
+    kept under its original name for references made any other way (srcset,
+    inline styles, paths built in JavaScript). Outputs are content addressed,
+    so files whose hashed name already exists in the destination are not
+    rewritten or recompressed on the next run.
+    """
+
+    def __init__(self, source, destination, force=False):
+        if os.path.realpath(source) == os.path.realpath(destination):
+            raise ValueError("The output directory must differ from the source directory")
+        self.source = source
+        self.destination = destination
+        self.force = force
+        self.cache = load_cache(self.destination)
+        if force:
+            # Still remember what earlier builds wrote so it can be pruned
+            self.cache = {'outputs': self.cache.get('outputs', [])}
+        self.outputs = {}     # source path -> output path
+        self.contents = {}    # output path -> bytes
+        self.deps = {}        # output path -> output paths it loads
+        self.external = {}    # page -> CDN references that are not counted
+        self.compressed = {}  # output path -> {'.gz': size, '.br': size}
+        self.written = 0
+        self.reused = 0
+
+    def run(self):
+        self._warn_missing_features()
+        files = self._collect()
+        pages = [rel for rel in files if rel.endswith('.html')]
+        scripts = [rel for rel in files if rel.endswith('.js')]
+        styles = [rel for rel in files if rel.endswith('.css')]
+        others = [rel for rel in files if rel not in pages and rel not in scripts and rel not in styles]
+
+        # Leaf assets first so stylesheets and pages can point at their hashed names
+        for rel in others:
+            self._process_binary(rel)
+        for rel in scripts:
+            data = self._js(rel)
+            self._emit(rel, fingerprint(rel, data), data)
+        for rel in styles:
+            data, deps = self._css(rel, rel)
+            self._emit(rel, fingerprint(rel, data), data, deps)
+        for rel in pages:
+            data, deps = self._html(rel)
+            self._emit(rel, rel, data, deps)
+
+        self._precompress()
+        self._prune()
+        manifest = self._write_manifest(pages)
+        self._save_cache()
+        print(f"Asset pipeline: {self.written} files written, {self.reused} unchanged.")
+        return manifest
+
+    def _warn_missing_features(self):
+        """Say which optimizations are skipped, since the manifest numbers depend on them"""
+        if not BROTLI_AVAILABLE:
+            print("Warning: brotli is not installed, no .br files will be written.")
+        if not MINIFIERS_AVAILABLE:
+            print("Warning: rjsmin/rcssmin are not installed, JavaScript will not be minified "
+                  "and CSS only gets basic whitespace removal.")
+        if not PIL_AVAILABLE:
+            print("Warning: Pillow is not installed, large GIFs will not be transcoded to WebP.")
+
+    def _collect(self):
+        files = []
+        destination = os.path.realpath(self.destination)
+        for root, dirs, names in os.walk(self.source):
+            # An output directory nested in the source must not be fed back in
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.')
+                             and os.path.realpath(os.path.join(root, d)) != destination)
+            for name in sorted(names):
+                if name.startswith('.') or os.path.splitext(name)[1].lower() in SKIPPED_EXTENSIONS:
+                    continue
+                path = os.path.join(root, name)
+                files.append(os.path.relpath(path, self.source).replace(os.sep, '/'))
+        return files
+
+    def _read(self, rel):
+        with open(os.path.join(self.source, rel), 'rb') as f:
+            return f.read()
+
+    def _js(self, rel):
+        return minify_js(self._read(rel).decode('utf-8')).encode('utf-8')
+
+    def _css(self, rel, out_rel):
+        """Minify a stylesheet with its url() references rewritten relative to out_rel"""
+        deps = []
+
+        def replace(match):
+            quote, url = match.groups()
+            if not is_local_url(url):
+                return match.group(0)
+            target = self.outputs.get(resolve_url(url, rel))
+            if target is None:
+                return match.group(0)
+            deps.append(target)
+            return f"url({quote}{relative_url(target, out_rel)}{split_url(url)[1]}{quote})"
+
+        text = CSS_URL_PATTERN.sub(replace, self._read(rel).decode('utf-8'))
+        return minify_css(text).encode('utf-8'), deps
+
+    def _process_binary(self, rel):
+        data = self._read(rel)
+        if rel.lower().endswith('.gif') and len(data) > GIF_TRANSCODE_THRESHOLD and PIL_AVAILABLE:
+            # Transcoding is slow, so remember the outcome per input hash,
+            # including None when the WebP was not smaller
+            gifs = self.cache.setdefault('gifs', {})
+            key = sha256_bytes(data)
+            transcoded = gifs.get(key)
+            if transcoded and os.path.exists(os.path.join(self.destination, transcoded)):
+                with open(os.path.join(self.destination, transcoded), 'rb') as f:
+                    self._emit(rel, transcoded, f.read(), original=data)
+                return
+            if key not in gifs or transcoded:
+                webp = transcode_gif(data)
+                gifs[key] = None if webp is None else fingerprint(posixpath.splitext(rel)[0] + '.webp', webp)
+                if webp is not None:
+                    self._emit(rel, gifs[key], webp, original=data)
+                    return
+        self._emit(rel, fingerprint(rel, data), data)
+
+    def _bundle(self, html, page_rel, pattern, url_group, ext):
+        """Replace each run of adjacent local tags matched by pattern with one bundle tag"""
+        runs, current, last_end = [], [], None
+        for match in pattern.finditer(html):
+            url = match.group(url_group)
+            local = is_local_url(url) and resolve_url(url, page_rel) in self.outputs
+            adjacent = last_end is not None and GAP_PATTERN.match(html[last_end:match.start()])
+            if not local or not adjacent:
+                if len(current) > 1:
+                    runs.append(current)
+                current = []
+            if local:
+                current.append(match)
+            last_end = match.end()
+        if len(current) > 1:
+            runs.append(current)
+
+        for run in reversed(runs):
+            members = [resolve_url(m.group(url_group), page_rel) for m in run]
+            bundle_dir = posixpath.dirname(members[0])
+            placeholder = posixpath.join(bundle_dir, 'bundle' + ext)
+            parts, deps = [], []
+            for member in members:
+                if ext == '.css':
+                    data, member_deps = self._css(member, placeholder)
+                    deps.extend(member_deps)
+                else:
+                    # Separate scripts so a missing trailing semicolon cannot join statements
+                    data = self._js(member) + b';'
+                parts.append(data)
+            data = b'\n'.join(parts)
+            out_rel = fingerprint(placeholder, data)
+            self._emit(None, out_rel, data, deps)
+            url = run[0].group(url_group)
+            ref = relative_url(out_rel, page_rel, absolute=url.startswith('/'))
+            tag = run[0].group(0).replace(url, ref)
+            html = html[:run[0].start()] + tag + html[run[-1].end():]
+        return html
+
+    def _html(self, rel):
+        html = self._read(rel).decode('utf-8')
+        html = self._bundle(html, rel, STYLESHEET_TAG_PATTERN, 3, '.css')
+        html = self._bundle(html, rel, SCRIPT_TAG_PATTERN, 2, '.js')
+
+        def replace(match):
+            attr, equals, quote, url = match.groups()
+            if not is_local_url(url):
+                return match.group(0)
+            target = self.outputs.get(resolve_url(url, rel))
+            if target is None:
+                return match.group(0)
+            ref = relative_url(target, rel, absolute=url.startswith('/')) + split_url(url)[1]
+            return f"{attr}{equals}{quote}{ref}{quote}"
+
+        html = ATTR_PATTERN.sub(replace, html)
+        return html.encode('utf-8'), self._page_deps(html, rel)
+
+    def _page_deps(self, html, rel):
+        """Everything the browser fetches for a page (anchors are not loaded)"""
+        deps, external = [], []
+        for tag in LOADED_TAG_PATTERN.finditer(html):
+            if tag.group(1).lower() == 'link':
+                rel_attr = REL_PATTERN.search(tag.group(0))
+                rels = set(rel_attr.group(2).lower().split()) if rel_attr else set()
+                if not rels & LOADED_LINK_RELS:
+                    continue
+            for attr in ATTR_PATTERN.finditer(tag.group(0)):
+                url = attr.group(4)
+                if not is_local_url(url):
+                    external.append(url)
+                elif resolve_url(url, rel) in self.contents:
+                    deps.append(resolve_url(url, rel))
+        self.external[rel] = sorted(set(external))
+        return deps
+
+    def _emit(self, source_rel, out_rel, data, deps=None, original=None):
+        if source_rel is not None:
+            self.outputs[source_rel] = out_rel
+            if source_rel != out_rel:
+                self.contents[source_rel] = data if original is None else original
+                self.deps[source_rel] = deps or []
+        self.contents[out_rel] = data
+        self.deps[out_rel] = deps or []
+
+    def _write(self, out_rel, data):
+        path = os.path.join(self.destination, out_rel)
+        if not self.force and os.path.exists(path):
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    self.reused += 1
+                    return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.written += 1
+        return True
+
+    def _precompress(self):
+        previous = self.cache.get('compressed', {})
+        recorded = {}  # compressed file -> hash of the file it was made from
+        for out_rel, data in list(self.contents.items()):
+            self._write(out_rel, data)
+            if posixpath.splitext(out_rel)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            digest = sha256_bytes(data)
+            variants = {'.gz': lambda d: gzip.compress(d, compresslevel=9, mtime=0)}
+            if BROTLI_AVAILABLE:
+                variants['.br'] = lambda d: brotli.compress(d, quality=11)
+            for suffix, compress in variants.items():
+                path = os.path.join(self.destination, out_rel + suffix)
+                # A sibling left by an interrupted run may not match its base file
+                if previous.get(out_rel + suffix) == digest and os.path.exists(path):
+                    size = os.path.getsize(path)
+                    self.reused += 1
+                else:
+                    compressed = compress(data)
+                    if len(compressed) >= len(data):
+                        continue
+                    self._write(out_rel + suffix, compressed)
+                    size = len(compressed)
+                recorded[out_rel + suffix] = digest
+                self.compressed.setdefault(out_rel, {})[suffix] = size
+        self.cache['compressed'] = recorded
+
+    def _prune(self):
+        """Remove outputs of earlier builds that this build no longer produces.
+
+        Only files recorded in the build state are candidates, so anything else
+        that happens to live in the output directory is left alone.
+        """
+        produced = set(self.contents)
+        for out_rel, sizes in self.compressed.items():
+            produced.update(out_rel + suffix for suffix in sizes)
+
+        for out_rel in set(self.cache.get('outputs', [])) - produced:
+            path = os.path.join(self.destination, out_rel)
+            if os.path.isfile(path):
+                os.remove(path)
+            # Drop directories this removal left empty, but never the output root
+            directory = os.path.dirname(path)
+            while (os.path.realpath(directory) != os.path.realpath(self.destination)
+                   and os.path.isdir(directory) and not os.listdir(directory)):
+                os.rmdir(directory)
+                directory = os.path.dirname(directory)
+        self.cache['outputs'] = sorted(produced)
+
+    def _transfer_size(self, out_rel):
+        sizes = self.compressed.get(out_rel, {})
+        return min([len(self.contents[out_rel])] + list(sizes.values()))
+
+    def _write_manifest(self, pages):
+        manifest = {
+            # Which optimizations the byte counts below include
+            'optimizations': {
+                'brotli': BROTLI_AVAILABLE,
+                'minified': MINIFIERS_AVAILABLE,
+                'gif_to_webp': PIL_AVAILABLE,
+            },
+            'assets': {},
+            'pages': {},
+        }
+        for source_rel, out_rel in sorted(self.outputs.items()):
+            manifest['assets'][source_rel] = {
+                'file': out_rel,
+                'bytes': len(self.contents[out_rel]),
+                'compressed': self.compressed.get(out_rel, {}),
+            }
+        for page in pages:
+            # Walk page -> stylesheet -> image so CSS-referenced assets are counted too
+            loaded, pending = [], [page]
+            while pending:
+                out_rel = pending.pop(0)
+                if out_rel in loaded:
+                    continue
+                loaded.append(out_rel)
+                pending.extend(self.deps.get(out_rel, []))
+            # Only same-origin files are counted; 'external' lists what is fetched on top
+            manifest['pages'][page] = {
+                'requests': len(loaded),
+                'local_cold_load_bytes': sum(self._transfer_size(out_rel) for out_rel in loaded),
+                'uncompressed_bytes': sum(len(self.contents[out_rel]) for out_rel in loaded),
+                'files': loaded,
+                'external': self.external.get(page, []),
+            }
+            print(f"{page}: cold load transfers {manifest['pages'][page]['local_cold_load_bytes']} "
+                  f"same-origin bytes in {len(loaded)} requests "
+                  f"(+{len(manifest['pages'][page]['external'])} external)")
+        with open(os.path.join(self.destination, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def _save_cache(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(cache_path(self.destination), 'w') as f:
+            json.dump(self.cache, f, indent=2)
+
+
+def inputs_digest(base_dir, inputs):
+    """Hash every file the frozen site depends on, in a stable order"""
+    digest = hashlib.sha256()
+    for item in inputs:
+        path = os.path.join(base_dir, item)
+        paths = [path] if os.path.isfile(path) else sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(path) if '__pycache__' not in root
+            for name in names)
+        for file_path in paths:
+            digest.update(os.path.relpath(file_path, base_dir).encode('utf-8'))
+            with open(file_path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def freeze_flask_app(force=False):
+    """Freeze the Flask app into the staging directory unless its inputs are unchanged"""
+    digest = inputs_digest(BASE_DIR, FREEZE_INPUTS)
+    try:
+        with open(STAGE_MARKER) as f:
+            staged_digest = f.read().strip()
+    except OSError:
+        staged_digest = None
+    if not force and digest == staged_digest:
+        print("Flask app inputs unchanged, reusing the previous freeze.")
+        return
+
+    # A freeze that fails partway must not leave a stage that looks current
+    if os.path.exists(STAGE_MARKER):
+        os.remove(STAGE_MARKER)
+
+    from flask_frozen import Freezer
+
+    from flask_frozen import Freezer
+    from app import app  # Import your Flask app
+
+    # Initialize Freezer
+    freezer = Freezer(app)
+    # Freeze into a staging directory; the asset pipeline writes the final build
+    app.config['FREEZER_DESTINATION'] = STAGE_DIR
     # Create relative URLs rather than absolute URLs
     app.config['FREEZER_RELATIVE_URLS'] = False
-    
+
     # Generate static files
     freezer.freeze()
-    
-    print("Flask-Frozen has completed. Your static site is in the build directory.")
+
+    with open(STAGE_MARKER, 'w') as f:
+        f.write(digest)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Freeze OpenGrammar into an optimized static site.")
+    parser.add_argument('--site', help="Optimize an existing static directory (e.g. ../Final) "
+                                       "instead of freezing the Flask app")
+    parser.add_argument('--dest', default=os.path.join(BASE_DIR, 'build'),
+                        help="Output directory (default: build)")
+    parser.add_argument('--force', action='store_true', help="Rebuild everything, ignoring caches")
+    args = parser.parse_args()
+
+    source = args.site or STAGE_DIR
+    if os.path.realpath(source) == os.path.realpath(args.dest):
+        parser.error("--dest must differ from the directory being optimized")
+
+    os.makedirs(args.dest, exist_ok=True)
+    if args.site:
+        pipeline = AssetPipeline(args.site, args.dest, force=args.force)
+    else:
+        freeze_flask_app(force=args.force)
+        pipeline = AssetPipeline(STAGE_DIR, args.dest, force=args.force)
+    pipeline.run()
+
+    print(f"Freezing has completed. Your static site is in {args.dest}.")
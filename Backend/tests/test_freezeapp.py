@@ -0,0 +1,297 @@
+import gzip
+import os
+import sys
+import types
+
+import pytest
+
+import freezeapp
+from freezeapp import (AssetPipeline, fingerprint, is_local_url, minify_css,
+                       relative_url, resolve_url, split_url)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(freezeapp, 'CACHE_DIR', str(tmp_path / 'cache'))
+
+
+def write(root, rel, text):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def read(root, rel):
+    with open(os.path.join(root, rel)) as f:
+        return f.read()
+
+
+def test_split_url():
+    assert split_url('css/a.css?v=1#x') == ('css/a.css', '?v=1#x')
+    assert split_url('css/a.css') == ('css/a.css', '')
+
+
+@pytest.mark.parametrize('url, local', [
+    ('css/a.css', True),
+    ('/static/logo.PNG', True),
+    ('../img/x.png', True),
+    ('https://cdn.tailwindcss.com', False),
+    ('//fonts.gstatic.com', False),
+    ('#top', False),
+    ('data:image/png;base64,AAAA', False),
+    ('mailto:a@b.c', False),
+])
+def test_is_local_url(url, local):
+    assert bool(is_local_url(url)) is local
+
+
+def test_resolve_url():
+    assert resolve_url('./static/logo.PNG', 'index.html') == 'static/logo.PNG'
+    assert resolve_url('../img/a.png?v=2', 'css/site.css') == 'img/a.png'
+    assert resolve_url('/static/logo.PNG', 'pages/about.html') == 'static/logo.PNG'
+
+
+def test_relative_url():
+    assert relative_url('img/a.1234.png', 'css/site.css') == '../img/a.1234.png'
+    assert relative_url('css/a.css', 'index.html') == 'css/a.css'
+    assert relative_url('static/logo.PNG', 'pages/about.html', absolute=True) == '/static/logo.PNG'
+
+
+def test_fingerprint_depends_on_content():
+    name = fingerprint('css/app.css', b'body{}')
+    assert name.startswith('css/app.') and name.endswith('.css')
+    assert name == fingerprint('css/app.css', b'body{}')
+    assert name != fingerprint('css/app.css', b'p{}')
+
+
+def test_minify_css_keeps_strings_and_urls():
+    css = 'a , b { content: "a, b /* x */" ; background: url(data:x;a*/b , c) ; } /* gone */'
+    assert minify_css(css) == 'a,b{content: "a, b /* x */";background: url(data:x;a*/b , c)}'
+
+
+def make_site(root):
+    write(root, 'css/a.css', 'a { color: red; }')
+    write(root, 'css/b.css', 'b { background: url(../img/x.png); }')
+    write(root, 'img/x.png', 'png')
+    write(root, 'js/one.js', 'var one = 1')
+    write(root, 'js/two.js', 'var two = 2')
+    write(root, 'js/three.js', 'var three = 3')
+
+
+def test_bundle_merges_only_adjacent_local_tags(tmp_path):
+    source, dest = str(tmp_path / 'site'), str(tmp_path / 'build')
+    make_site(source)
+    write(source, 'index.html', '\n'.join([
+        '<link rel="stylesheet" href="css/a.css">',
+        '<!-- styles -->',
+        '<link rel="stylesheet" href="css/b.css">',
+        '<script src="js/one.js"></script>',
+        '<script src="js/two.js"></script>',
+        '<script>inline()</script>',
+        '<script src="js/three.js"></script>',
+        '<script src="https://cdn.example.com/lib.js"></script>',
+    ]))
+    AssetPipeline(source, dest).run()
+
+    html = read(dest, 'index.html')
+    assert html.count('css/bundle.') == 1 and 'css/a.' not in html
+    assert html.count('js/bundle.') == 1
+    # The inline script splits the run, so three.js keeps its own tag
+    assert 'js/three.' in html and 'https://cdn.example.com/lib.js' in html
+
+    css_bundle = [n for n in os.listdir(os.path.join(dest, 'css')) if n.startswith('bundle.')]
+    css = read(dest, 'css/' + [n for n in css_bundle if n.endswith('.css')][0])
+    assert 'url(../img/x.' in css and '.png)' in css
+
+
+def test_assets_keep_their_original_names(tmp_path):
+    source, dest = str(tmp_path / 'site'), str(tmp_path / 'build')
+    make_site(source)
+    write(source, 'index.html', '<img src="img/x.png">')
+    manifest = AssetPipeline(source, dest).run()
+
+    hashed = manifest['assets']['img/x.png']['file']
+    assert hashed != 'img/x.png'
+    assert os.path.exists(os.path.join(dest, hashed))
+    assert os.path.exists(os.path.join(dest, 'img/x.png'))
+    assert hashed in read(dest, 'index.html')
+
+
+def test_prune_only_removes_recorded_outputs(tmp_path):
+    source, dest = str(tmp_path / 'site'), str(tmp_path / 'build')
+    make_site(source)
+    write(source, 'index.html', '<img src="img/x.png">')
+    write(dest, 'notes/keep.txt', 'not ours')
+    AssetPipeline(source, dest).run()
+    old = AssetPipeline(source, dest).cache['outputs']
+
+    write(source, 'img/x.png', 'changed')
+    AssetPipeline(source, dest).run()
+
+    assert read(dest, 'notes/keep.txt') == 'not ours'
+    stale = [rel for rel in old if rel.startswith('img/x.') and rel != 'img/x.png']
+    assert stale and not any(os.path.exists(os.path.join(dest, rel)) for rel in stale)
+
+
+def test_destination_must_differ_from_source(tmp_path):
+    make_site(str(tmp_path))
+    with pytest.raises(ValueError):
+        AssetPipeline(str(tmp_path), str(tmp_path))
+
+
+def test_nested_destination_is_not_collected(tmp_path):
+    source = str(tmp_path)
+    dest = os.path.join(source, 'build')
+    make_site(source)
+    AssetPipeline(source, dest).run()
+    first = sorted(os.listdir(os.path.join(dest, 'css')))
+    AssetPipeline(source, dest).run()
+
+    assert sorted(os.listdir(os.path.join(dest, 'css'))) == first
+    assert not os.path.exists(os.path.join(dest, 'build'))
+
+
+def test_freeze_reuses_stage_only_when_it_matches_current_inputs(tmp_path, monkeypatch):
+    base = str(tmp_path / 'backend')
+    write(base, 'templates/index.html', 'v1')
+    stage = os.path.join(base, '.freeze-stage')
+    monkeypatch.setattr(freezeapp, 'BASE_DIR', base)
+    monkeypatch.setattr(freezeapp, 'STAGE_DIR', stage)
+    monkeypatch.setattr(freezeapp, 'STAGE_MARKER', os.path.join(stage, '.inputs-digest'))
+
+    class Freezer:
+        def __init__(self, app):
+            self.app = app
+
+        def freeze(self):
+            write(self.app.config['FREEZER_DESTINATION'], 'index.html',
+                  read(base, 'templates/index.html'))
+
+    monkeypatch.setitem(sys.modules, 'flask_frozen', types.SimpleNamespace(Freezer=Freezer))
+    monkeypatch.setitem(sys.modules, 'app', types.SimpleNamespace(app=types.SimpleNamespace(config={})))
+
+    def build(version, dest):
+        write(base, 'templates/index.html', version)
+        freezeapp.freeze_flask_app()
+        AssetPipeline(stage, str(tmp_path / dest)).run()
+        return read(str(tmp_path / dest), 'index.html')
+
+    assert build('v1', 'a') == 'v1'
+    assert build('v2', 'b') == 'v2'
+    assert build('v1', 'a') == 'v1'
+
+
+def test_only_fetched_link_relations_count_towards_cold_load(tmp_path):
+    source, dest = str(tmp_path / 'site'), str(tmp_path / 'build')
+    make_site(source)
+    write(source, 'next.html', 'later')
+    write(source, 'index.html', '\n'.join([
+        '<link rel="preconnect" href="https://fonts.gstatic.com">',
+        '<link rel="prefetch" href="js/one.js">',
+        '<link rel="canonical" href="next.html">',
+        '<link rel="shortcut icon" href="img/x.png">',
+    ]))
+    page = AssetPipeline(source, dest).run()['pages']['index.html']
+
+    assert page['external'] == []
+    assert page['requests'] == 2
+    assert page['files'][1].startswith('img/x.')
+
+
+def test_compressed_sibling_is_rebuilt_when_its_base_changed(tmp_path):
+    source, dest = str(tmp_path / 'site'), str(tmp_path / 'build')
+    write(source, 'index.html', '<p>v1</p>' * 20)
+    AssetPipeline(source, dest).run()
+
+    # An interrupted run wrote the new page but never refreshed its .gz
+    write(source, 'index.html', '<p>v2</p>' * 20)
+    write(dest, 'index.html', '<p>v2</p>' * 20)
+    AssetPipeline(source, dest).run()
+
+    with gzip.open(os.path.join(dest, 'index.html.gz'), 'rt') as f:
+        assert f.read() == '<p>v2</p>' * 20
+
+
+def test_text_outputs_get_gzip_siblings(tmp_path):
+    source, dest = str(tmp_path / 'site'), str(tmp_path / 'build')
+    make_site(source)
+    write(source, 'index.html', '<p>hello</p>' * 50)
+    manifest = AssetPipeline(source, dest).run()
+
+    with gzip.open(os.path.join(dest, 'index.html.gz'), 'rt') as f:
+        assert f.read() == '<p>hello</p>' * 50
+    # Outputs too small to shrink are left without a sibling
+    tiny = manifest['assets']['img/x.png']['file']
+    assert not os.path.exists(os.path.join(dest, tiny + '.gz'))
+
+
+def test_unchanged_rerun_writes_nothing(tmp_path):
+    source, dest = str(tmp_path / 'site'), str(tmp_path / 'build')
+    make_site(source)
+    write(source, 'index.html', '<link rel="stylesheet" href="css/b.css">' * 10)
+    first = AssetPipeline(source, dest)
+    first.run()
+
+    second = AssetPipeline(source, dest)
+    second.run()
+    assert second.written == 0
+    assert second.reused == first.written
+
+
+def test_cold_load_follows_page_stylesheet_image(tmp_path):
+    source, dest = str(tmp_path / 'site'), str(tmp_path / 'build')
+    make_site(source)
+    write(source, 'index.html', '<link rel="stylesheet" href="css/b.css">'
+                                '<script src="https://cdn.example.com/lib.js"></script>')
+    page = AssetPipeline(source, dest).run()['pages']['index.html']
+
+    assert page['requests'] == 3
+    assert [name.split('.')[0] for name in page['files']] == ['index', 'css/b', 'img/x']
+    assert page['external'] == ['https://cdn.example.com/lib.js']
+
+    def transfer(rel):
+        sizes = [os.path.getsize(os.path.join(dest, rel))]
+        if os.path.exists(os.path.join(dest, rel + '.gz')):
+            sizes.append(os.path.getsize(os.path.join(dest, rel + '.gz')))
+        return min(sizes)
+
+    assert page['local_cold_load_bytes'] == sum(transfer(rel) for rel in page['files'])
+
+
+@pytest.fixture
+def big_gif(tmp_path, monkeypatch):
+    monkeypatch.setattr(freezeapp, 'PIL_AVAILABLE', True)
+    source = str(tmp_path / 'site')
+    write(source, 'index.html', '<img src="anim.gif">')
+    write(source, 'anim.gif', 'G' * (freezeapp.GIF_TRANSCODE_THRESHOLD + 1))
+    return source
+
+
+def test_large_gif_is_served_as_webp(tmp_path, monkeypatch, big_gif):
+    calls = []
+    monkeypatch.setattr(freezeapp, 'transcode_gif', lambda data: calls.append(data) or b'webp')
+    dest = str(tmp_path / 'build')
+    manifest = AssetPipeline(big_gif, dest).run()
+
+    webp = manifest['assets']['anim.gif']['file']
+    assert webp.endswith('.webp') and read(dest, webp) == 'webp'
+    assert webp in read(dest, 'index.html')
+    # The original name still serves the GIF itself
+    assert read(dest, 'anim.gif') == read(big_gif, 'anim.gif')
+
+    AssetPipeline(big_gif, dest).run()
+    assert len(calls) == 1
+
+
+def test_gif_without_gain_is_not_transcoded_again(tmp_path, monkeypatch, big_gif):
+    calls = []
+    monkeypatch.setattr(freezeapp, 'transcode_gif', lambda data: calls.append(data))
+    dest = str(tmp_path / 'build')
+    manifest = AssetPipeline(big_gif, dest).run()
+    assert manifest['assets']['anim.gif']['file'].endswith('.gif')
+
+    pipeline = AssetPipeline(big_gif, dest)
+    pipeline.run()
+    assert len(calls) == 1
+    assert list(pipeline.cache['gifs'].values()) == [None]